@@ -1,74 +1,394 @@
 import os
+import asyncio
+import functools
+import hashlib
+import heapq
+import hmac
+import logging
+import multiprocessing
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-from typing import Optional
-
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import Response
-from jose import jwt, JWTError
-from passlib.context import CryptContext
+from typing import Literal, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from fastapi.responses import ORJSONResponse, Response
+import jwt
+import bcrypt
+import orjson
 from bson import ObjectId
+from cachetools import LRUCache, TTLCache
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError, ServerSelectionTimeoutError
+from dotenv import load_dotenv
+
+load_dotenv()
 
-from database import db
+logger = logging.getLogger(__name__)
 
 # ----------------------
 # App & Security Setup
 # ----------------------
-app = FastAPI(title="TapPay API", version="0.1.0")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+# bcrypt is pure CPU work; run it in a process pool so it neither blocks
+# the event loop nor contends for the GIL.
+executor: Optional[ProcessPoolExecutor] = None
+
+
+def bcrypt_pool_size() -> int:
+    """Per-worker pool size, so all uvicorn workers together use ~one
+    process per core."""
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global executor, _mongo_client, db
+    # forkserver: pool processes are started lazily, after Motor's threads
+    # exist, and forking a multithreaded process can deadlock the child.
+    executor = ProcessPoolExecutor(
+        max_workers=bcrypt_pool_size(),
+        mp_context=multiprocessing.get_context("forkserver"),
+    )
+    if _mongo_url and _mongo_name:
+        _mongo_client = create_mongo_client(_mongo_url)
+        db = _mongo_client[_mongo_name]
+        await ensure_indexes()
+    try:
+        yield
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if _mongo_client is not None:
+            _mongo_client.close()
+
+
+def _orjson_default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError
+
+
+class AppJSONResponse(ORJSONResponse):
+    """orjson-backed JSON responses; naive datetimes are treated as UTC.
+
+    FastAPI runs jsonable_encoder on plain return values before render(), so
+    routes that return datetimes/ObjectIds construct this class directly.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_orjson_default,
+            option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS,
+        )
+
+
+app = FastAPI(
+    title="TapPay API",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=AppJSONResponse,
 )
 
 SECRET_KEY = os.getenv("JWT_SECRET", "dev-secret")
+SECRET = SECRET_KEY.encode()
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
+ACCESS_TOKEN_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+UTC = timezone.utc
+
+BCRYPT_ROUNDS = 12
+
+# Repeat-auth caches: bcrypt verdicts keyed by (HMAC(password), hash) -- the raw
+# password is never stored -- and token -> (user id, exp) for a short window.
+_verify_cache: LRUCache = LRUCache(maxsize=4096)
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+# Per-user dashboard stats; invalidated by send_money for both parties
+_stats_cache: TTLCache = TTLCache(maxsize=10_000, ttl=15)
+
+# Async MongoDB handle (Motor) so DB round-trips don't block the event loop.
+# One client per worker process, created in the lifespan (i.e. after uvicorn
+# forks) so workers never share sockets or an event loop.
+_mongo_url = os.getenv("DATABASE_URL")
+_mongo_name = os.getenv("DATABASE_NAME")
+_mongo_client: Optional[AsyncIOMotorClient] = None
+db = None
+
+
+def create_mongo_client(url: str) -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(
+        url,
+        maxPoolSize=100,
+        minPoolSize=10,
+        serverSelectionTimeoutMS=2000,
+        socketTimeoutMS=5000,
+        # zstd wire compression (needs the zstandard package)
+        compressors="zstd",
+        retryWrites=True,
+    )
+
+HANDLE_PATTERN = r"^[a-z0-9_]{3,20}$"
+# Fast-reject malformed handles before touching Mongo. fullmatch rather than
+# match with "$", which would also accept a trailing newline.
+HANDLE_RE = re.compile(r"[a-z0-9_]{3,20}").fullmatch
+
+# Reads outside of login never need the password hash
+PUBLIC_USER_PROJECTION = {"password_hash": 0}
+LOGIN_USER_PROJECTION = {
+    "password_hash": 1, "name": 1, "handle": 1, "profileImg": 1,
+    "qrCodeUrl": 1, "dateCreated": 1, "email": 1,
+}
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-auth_scheme = HTTPBearer()
+# Transaction rows as returned to clients; Mongo stringifies _id itself
+HISTORY_PROJECTION = {
+    "_id": 0, "id": {"$toString": "$_id"},
+    "fromUser": 1, "toUser": 1, "amount": 1, "timestamp": 1,
+}
 
 # ----------------------
 # Helpers
 # ----------------------
 
+INDEXES = [
+    ("user", "handle", {"unique": True}),
+    ("user", "email", {"unique": True}),
+    # One compound index per side so $or queries can use index union
+    ("transaction", [("fromUser", 1), ("timestamp", -1)], {}),
+    ("transaction", [("toUser", 1), ("timestamp", -1)], {}),
+]
+
+
+# signup relies on the unique user indexes for duplicate detection only once
+# they are confirmed; until then it falls back to find_one pre-checks.
+_unique_indexes_ready = False
+_unique_indexes_checked_at: Optional[float] = None
+UNIQUE_INDEX_RETRY_SECONDS = 30
+
+
+async def ensure_indexes():
+    """Best-effort index build; failures are logged so the app still boots
+    (an unreachable DB or duplicate data is then reported by /test)."""
+    global _unique_indexes_ready, _unique_indexes_checked_at
+    _unique_indexes_checked_at = time.monotonic()
+    unique_built = 0
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except ServerSelectionTimeoutError as e:
+            logger.warning("Skipping index creation, database unreachable: %s", e)
+            return
+        except Exception as e:
+            logger.warning("Could not create index %s on %s: %s", keys, collection, e)
+        else:
+            if options.get("unique"):
+                unique_built += 1
+    _unique_indexes_ready = unique_built == sum(1 for *_, o in INDEXES if o.get("unique"))
+
+
+async def unique_indexes_ready() -> bool:
+    """Retry the index build (throttled) until the unique indexes exist."""
+    if not _unique_indexes_ready and (
+        _unique_indexes_checked_at is None
+        or time.monotonic() - _unique_indexes_checked_at >= UNIQUE_INDEX_RETRY_SECONDS
+    ):
+        await ensure_indexes()
+    return _unique_indexes_ready
+
+
+# bcrypt only looks at the first 72 bytes of the password
+def _hash_password(password: str) -> str:
+    # Module-level so it can be pickled into the process pool
+    return bcrypt.hashpw(password.encode()[:72], bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
+
+
+def _verify_password(password: str, password_hash: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode()[:72], password_hash.encode())
+    except ValueError:
+        # Empty or malformed stored hash
+        return False
+
+
+async def verify_password_cached(password: str, password_hash: str) -> bool:
+    key = (hmac.new(SECRET, password.encode(), "sha256").hexdigest(), password_hash)
+    cached = _verify_cache.get(key)
+    if cached is not None:
+        return cached
+    loop = asyncio.get_running_loop()
+    ok = await loop.run_in_executor(executor, _verify_password, password, password_hash)
+    _verify_cache[key] = ok
+    return ok
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    ttl = int(expires_delta.total_seconds()) if expires_delta else ACCESS_TOKEN_EXPIRE_SECONDS
+    to_encode["exp"] = int(time.time()) + ttl
+    encoded_jwt = jwt.encode(to_encode, SECRET, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(auth_scheme)):
-    token = credentials.credentials
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
+# Path prefixes that require a valid Bearer token
+AUTH_PREFIXES = ("/transaction/", "/dashboard/")
+
+
+async def _send_json(send, status: int, content: dict):
+    body = orjson.dumps(content)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class JWTAuthMiddleware:
+    """Pure ASGI middleware: decodes the Bearer token once for protected paths
+    and stores the user id in scope["state"]["user_id"]."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or not scope["path"].startswith(AUTH_PREFIXES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        authorization = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value.decode("latin-1")
+                break
+        if not authorization:
+            await _send_json(send, 403, {"detail": "Not authenticated"})
+            return
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            await _send_json(send, 403, {"detail": "Invalid authentication credentials"})
+            return
+
+        user_id = None
+        cached = _token_cache.get(token)
+        # A hit skips jwt.decode, so the token's own expiry is checked here
+        if cached is not None and cached[1] > time.time():
+            user_id = cached[0]
         if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        user_doc = db["user"].find_one({"_id": ObjectId(user_id)})
-        if not user_doc:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user_doc
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Token decode error")
-
+            try:
+                payload = jwt.decode(token, SECRET, algorithms=[ALGORITHM])
+            except jwt.PyJWTError:
+                await _send_json(send, 401, {"detail": "Token decode error"})
+                return
+            user_id = payload.get("sub")
+            if not isinstance(user_id, str) or not ObjectId.is_valid(user_id):
+                await _send_json(send, 401, {"detail": "Invalid token"})
+                return
+            _token_cache[token] = (user_id, payload.get("exp", float("inf")))
+
+        scope.setdefault("state", {})["user_id"] = user_id
+        await self.app(scope, receive, send)
+
+
+def get_current_user(request: Request) -> str:
+    user_id = request.scope.get("state", {}).get("user_id")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return user_id
+
+
+# Any origin, with credentials, so the origin is echoed back rather than "*"
+CORS_PREFLIGHT_HEADERS = [
+    (b"access-control-allow-methods", b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"),
+    (b"access-control-allow-credentials", b"true"),
+    (b"access-control-max-age", b"600"),
+    (b"vary", b"Origin"),
+    (b"content-type", b"text/plain; charset=utf-8"),
+    (b"content-length", b"2"),
+]
+CORS_SIMPLE_HEADERS = [
+    (b"access-control-allow-credentials", b"true"),
+    (b"vary", b"Origin"),
+]
+
+
+class CORSMiddleware:
+    """Pure ASGI CORS for allow-all origins/methods/headers with credentials.
+
+    Requests without an Origin header pass straight through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            headers = [(b"access-control-allow-origin", origin), *CORS_PREFLIGHT_HEADERS]
+            if request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b"OK"})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"access-control-allow-origin", origin),
+                    *CORS_SIMPLE_HEADERS,
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+app.add_middleware(JWTAuthMiddleware)
+app.add_middleware(CORSMiddleware)
 
 # ----------------------
 # Health/Test
 # ----------------------
+# Pre-encoded: the root probe skips response validation and JSON encoding
+_ROOT = Response(content=b'{"message":"TapPay API running"}', media_type="application/json")
+
+# /test result reused briefly so liveness probes don't hammer Mongo
+_test_cache: TTLCache = TTLCache(maxsize=1, ttl=5)
+
+
 @app.get("/")
-def read_root():
-    return {"message": "TapPay API running"}
+async def read_root():
+    return _ROOT
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
+    cached = _test_cache.get("test")
+    if cached is not None:
+        return cached
+
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -82,29 +402,40 @@ def test_database():
             # Touch database to verify connection
             response["database"] = "✅ Connected"
             response["connection_status"] = "Connected"
-            response["collections"] = db.list_collection_names()[:10]
+            response["collections"] = (await db.list_collection_names())[:10]
     except Exception as e:
         response["database"] = f"⚠️ {str(e)[:60]}"
-    return response
+    _test_cache["test"] = rendered = AppJSONResponse(response)
+    return rendered
 
 
 # ----------------------
 # Schemas (simple inline to avoid circular imports)
 # ----------------------
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, field_validator
 from typing import Optional, List
 
 class UserCreate(BaseModel):
     name: str
-    handle: str = Field(..., pattern=r"^[a-z0-9_]{3,20}$")
+    handle: str = Field(..., pattern=HANDLE_PATTERN)
     email: EmailStr
     password: str
     profileImg: Optional[str] = None
 
+    @field_validator("email", mode="after")
+    @classmethod
+    def _lower_email(cls, v: str) -> str:
+        return v.lower()
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+    @field_validator("email", mode="after")
+    @classmethod
+    def _lower_email(cls, v: str) -> str:
+        return v.lower()
+
 class TransactionCreate(BaseModel):
     toHandle: Optional[str] = None
     toUserId: Optional[str] = None
@@ -114,26 +445,35 @@ class TransactionCreate(BaseModel):
 # Auth Routes
 # ----------------------
 @app.post("/auth/signup")
-def signup(payload: UserCreate):
-    if db["user"].find_one({"handle": payload.handle}):
-        raise HTTPException(status_code=400, detail="Handle already taken")
-    if db["user"].find_one({"email": str(payload.email).lower()}):
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    password_hash = pwd_context.hash(payload.password)
+async def signup(payload: UserCreate):
+    if not await unique_indexes_ready():
+        if await db["user"].find_one({"handle": payload.handle}, {"_id": 1}):
+            raise HTTPException(status_code=400, detail="Handle already taken")
+        if await db["user"].find_one({"email": payload.email}, {"_id": 1}):
+            raise HTTPException(status_code=400, detail="Email already registered")
+
+    loop = asyncio.get_running_loop()
+    password_hash = await loop.run_in_executor(executor, _hash_password, payload.password)
     user_doc = {
         "name": payload.name,
         "handle": payload.handle,
-        "email": str(payload.email).lower(),
+        "email": payload.email,
         "password_hash": password_hash,
         "profileImg": payload.profileImg,
         "qrCodeUrl": None,
-        "dateCreated": datetime.now(timezone.utc),
+        "dateCreated": datetime.now(UTC),
     }
-    result_id = db["user"].insert_one(user_doc).inserted_id
+    # Once the unique indexes exist the insert itself is the duplicate check
+    try:
+        result_id = (await db["user"].insert_one(user_doc)).inserted_id
+    except DuplicateKeyError as e:
+        key_pattern = (e.details or {}).get("keyPattern", {})
+        if "handle" in key_pattern:
+            raise HTTPException(status_code=400, detail="Handle already taken")
+        raise HTTPException(status_code=400, detail="Email already registered")
 
     token = create_access_token({"sub": str(result_id)})
-    return {
+    return AppJSONResponse({
         "token": token,
         "user": {
             "id": str(result_id),
@@ -143,19 +483,19 @@ def signup(payload: UserCreate):
             "qrCodeUrl": user_doc.get("qrCodeUrl"),
             "dateCreated": user_doc["dateCreated"],
         }
-    }
+    })
 
 
 @app.post("/auth/login")
-def login(payload: UserLogin):
-    user_doc = db["user"].find_one({"email": str(payload.email).lower()})
+async def login(payload: UserLogin):
+    user_doc = await db["user"].find_one({"email": payload.email}, LOGIN_USER_PROJECTION)
     if not user_doc:
         raise HTTPException(status_code=400, detail="Invalid credentials")
-    if not pwd_context.verify(payload.password, user_doc.get("password_hash", "")):
+    if not await verify_password_cached(payload.password, user_doc.get("password_hash", "")):
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
     token = create_access_token({"sub": str(user_doc["_id"])})
-    return {
+    return AppJSONResponse({
         "token": token,
         "user": {
             "id": str(user_doc["_id"]),
@@ -165,69 +505,104 @@ def login(payload: UserLogin):
             "qrCodeUrl": user_doc.get("qrCodeUrl"),
             "dateCreated": user_doc["dateCreated"],
         }
-    }
+    })
 
 
 # ----------------------
 # Profile & QR Routes
 # ----------------------
 @app.get("/profile/{handle}")
-def get_profile(handle: str):
-    user_doc = db["user"].find_one({"handle": handle})
+async def get_profile(handle: str):
+    if not HANDLE_RE(handle):
+        raise HTTPException(status_code=400, detail="Invalid handle")
+    user_doc = await db["user"].find_one({"handle": handle}, PUBLIC_USER_PROJECTION)
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
-    return {
+    return AppJSONResponse({
         "id": str(user_doc["_id"]),
         "name": user_doc["name"],
         "handle": user_doc["handle"],
         "profileImg": user_doc.get("profileImg"),
         "qrCodeUrl": user_doc.get("qrCodeUrl"),
         "dateCreated": user_doc["dateCreated"],
-    }
+    })
 
 
-# Return a PNG QR code for the given handle
-@app.get("/qr/{handle}")
-def qr_for_handle(handle: str):
-    try:
-        import qrcode
-        from io import BytesIO
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"QR generation unavailable: {e}")
+QR_MEDIA_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
 
-    base = os.getenv("APP_BASE_URL", "https://tappay.me")
-    link = f"{base.rstrip('/')}/{handle}"
+
+@functools.lru_cache(maxsize=4096)
+def _render_qr(link: str, fmt: str = "svg") -> Tuple[bytes, str]:
+    """Render the QR code for a link once; returns (content, etag).
+
+    SVG is built as text by qrcode itself (no PIL/zlib); PNG is kept for
+    clients that need a raster image.
+    """
+    import qrcode
+    from io import BytesIO
+
+    qr_kwargs = {}
+    if fmt == "svg":
+        import qrcode.image.svg
+        qr_kwargs["image_factory"] = qrcode.image.svg.SvgPathImage
 
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_M,
         box_size=10,
         border=2,
+        **qr_kwargs,
     )
     qr.add_data(link)
     qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
 
     buf = BytesIO()
-    img.save(buf, format="PNG")
-    png_bytes = buf.getvalue()
+    if fmt == "svg":
+        qr.make_image().save(buf)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buf, format="PNG")
+    content = buf.getvalue()
+    return content, f'"{hashlib.md5(content).hexdigest()}"'
+
+
+# Return an SVG (default) or PNG QR code for the given handle
+@app.get("/qr/{handle}")
+def qr_for_handle(
+    handle: str,
+    request: Request,
+    fmt: Literal["svg", "png"] = Query("svg", alias="format"),
+):
+    if not HANDLE_RE(handle):
+        raise HTTPException(status_code=400, detail="Invalid handle")
 
-    return Response(content=png_bytes, media_type="image/png")
+    base = os.getenv("APP_BASE_URL", "https://tappay.me")
+    link = f"{base.rstrip('/')}/{handle}"
+
+    try:
+        content, etag = _render_qr(link, fmt)
+    except ImportError as e:
+        raise HTTPException(status_code=500, detail=f"QR generation unavailable: {e}")
+
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=content, media_type=QR_MEDIA_TYPES[fmt], headers=headers)
 
 
 # ----------------------
 # Transactions
 # ----------------------
 @app.post("/transaction/send")
-def send_money(payload: TransactionCreate, user=Depends(get_current_user)):
+async def send_money(payload: TransactionCreate, user_id: str = Depends(get_current_user)):
     to_user = None
     if payload.toUserId:
-        try:
-            to_user = db["user"].find_one({"_id": ObjectId(payload.toUserId)})
-        except Exception:
+        if not ObjectId.is_valid(payload.toUserId):
             raise HTTPException(status_code=400, detail="Invalid toUserId")
+        to_user = await db["user"].find_one({"_id": ObjectId(payload.toUserId)}, {"_id": 1})
     elif payload.toHandle:
-        to_user = db["user"].find_one({"handle": payload.toHandle})
+        if not HANDLE_RE(payload.toHandle):
+            raise HTTPException(status_code=400, detail="Invalid handle")
+        to_user = await db["user"].find_one({"handle": payload.toHandle}, {"_id": 1})
     else:
         raise HTTPException(status_code=400, detail="Receiver not specified")
 
@@ -235,36 +610,67 @@ def send_money(payload: TransactionCreate, user=Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="Receiver not found")
 
     tx_doc = {
-        "fromUser": str(user["_id"]),
+        "fromUser": user_id,
         "toUser": str(to_user["_id"]),
         "amount": float(payload.amount),
-        "timestamp": datetime.now(timezone.utc),
+        "timestamp": datetime.now(UTC),
     }
-    tx_id = db["transaction"].insert_one(tx_doc).inserted_id
+    # Insert a copy so the driver-assigned ObjectId doesn't leak into the response
+    tx_id = (await db["transaction"].insert_one(tx_doc.copy())).inserted_id
+    _stats_cache.pop(tx_doc["fromUser"], None)
+    _stats_cache.pop(tx_doc["toUser"], None)
 
-    return {
+    return AppJSONResponse({
         "status": "sent",
         "transaction": {"id": str(tx_id), **tx_doc}
-    }
+    })
 
 
 @app.get("/transaction/history/{userId}")
-def get_history(userId: str, user=Depends(get_current_user)):
-    if str(user["_id"]) != userId:
+async def get_history(
+    userId: str,
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[datetime] = None,
+    user_id: str = Depends(get_current_user),
+):
+    if user_id != userId:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    txs = list(db["transaction"].find({
-        "$or": [{"fromUser": userId}, {"toUser": userId}]
-    }).sort("timestamp", -1))
-
-    for t in txs:
-        t["id"] = str(t.pop("_id"))
-    return txs
+    # Two range scans on the (fromUser|toUser, timestamp) indexes, run
+    # concurrently, instead of one $or query; merged newest-first below.
+    def page(field: str):
+        query = {field: userId}
+        if before is not None:
+            query["timestamp"] = {"$lt": before}
+        return (
+            db["transaction"]
+            .find(query, HISTORY_PROJECTION)
+            .sort("timestamp", -1)
+            .limit(limit)
+            .to_list(length=limit)
+        )
+
+    sent, received = await asyncio.gather(page("fromUser"), page("toUser"))
+
+    txs = []
+    seen = set()
+    for t in heapq.merge(sent, received, key=lambda t: t["timestamp"], reverse=True):
+        # Self-transfers show up on both sides
+        if t["id"] in seen:
+            continue
+        seen.add(t["id"])
+        txs.append(t)
+        if len(txs) == limit:
+            break
+    return AppJSONResponse(txs)
 
 
 @app.get("/dashboard/stats")
-def dashboard_stats(user=Depends(get_current_user)):
-    user_id = str(user["_id"])
+async def dashboard_stats(user_id: str = Depends(get_current_user)):
+    cached = _stats_cache.get(user_id)
+    if cached is not None:
+        return cached
+
     pipeline = [
         {"$match": {"$or": [{"fromUser": user_id}, {"toUser": user_id}]}},
         {"$group": {
@@ -276,27 +682,42 @@ def dashboard_stats(user=Depends(get_current_user)):
         }}
     ]
 
-    agg = list(db["transaction"].aggregate(pipeline))
+    agg = await db["transaction"].aggregate(pipeline, allowDiskUse=False).to_list(length=1)
     stats = agg[0] if agg else {"total_sent": 0.0, "total_received": 0.0, "count_sent": 0, "count_received": 0}
 
-    return {
+    result = {
         "total_sent": float(stats.get("total_sent", 0.0)),
         "total_received": float(stats.get("total_received", 0.0)),
         "count_sent": int(stats.get("count_sent", 0)),
         "count_received": int(stats.get("count_received", 0)),
     }
+    _stats_cache[user_id] = result
+    return result
 
 
 # ----------------------
 # Handle validation
 # ----------------------
 @app.get("/handle/check/{handle}")
-def check_handle(handle: str):
-    exists = db["user"].find_one({"handle": handle}) is not None
+async def check_handle(handle: str):
+    if not HANDLE_RE(handle):
+        raise HTTPException(status_code=400, detail="Invalid handle")
+    exists = await db["user"].count_documents({"handle": handle}, limit=1) > 0
     return {"handle": handle, "available": not exists}
 
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Exported so each worker can size its bcrypt pool (see bcrypt_pool_size)
+    os.environ.setdefault("WEB_CONCURRENCY", str(os.cpu_count() or 1))
+    # Import string (not the app object) is required for multiple workers
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.environ["WEB_CONCURRENCY"]),
+        log_level="warning",
+    )